@@ -0,0 +1,16 @@
+# gunicorn_conf.py
+# Cấu hình chạy API bằng gunicorn + UvicornWorker:
+#     gunicorn -c gunicorn_conf.py main:app
+# UvicornWorker tự chọn uvloop và httptools (có sẵn trong "uvicorn[standard]").
+
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Các pool được lưu trong bộ nhớ của từng process, nên mặc định chỉ chạy 1 worker để mọi
+# request thấy cùng một dữ liệu. Chỉ tăng WEB_CONCURRENCY (tối đa bằng số CPU) khi mỗi
+# pool luôn được định tuyến về cùng một worker.
+workers = min(int(os.environ.get("WEB_CONCURRENCY", "1")), multiprocessing.cpu_count())
+keepalive = 5
@@ -1,11 +1,21 @@
 # API:
-# 1. Cài đặt thư viện cần thiết: pip install fastapi "uvicorn[standard]"
+# 1. Cài đặt thư viện cần thiết: pip install fastapi "uvicorn[standard]" numpy orjson
+#    (tùy chọn) pip install numba để dùng các kernel quantile đã biên dịch.
 # 2. Chạy server từ terminal: uvicorn main:app --reload
+#    Khi triển khai: gunicorn -c gunicorn_conf.py main:app (uvloop + httptools).
 
-from fastapi import FastAPI, HTTPException, status
-from pydantic import BaseModel, Field
-from typing import List, Dict
-import math
+from fastapi import FastAPI, HTTPException, Response, status
+from pydantic import BaseModel, Field, conlist
+from typing import Annotated, List, Dict, Sequence, Tuple, Union
+import functools
+import os
+
+import numpy as np
+import orjson
+
+from pool_store import BinnedRankTree, SortedPool
+from semantic_quantile import NUMBA_AVAILABLE, sorted_quantiles_kernel, warm_up
+from tdigest import TDigest
 
 # --- Các Model Dữ liệu (Pydantic) ---
 
@@ -18,20 +28,70 @@ class PoolUpdateResponse(BaseModel):
     """Model cho response sau khi cập nhật pool."""
     status: str
 
+Percentile = Annotated[float, Field(gt=0, lt=100)]
+
 class PoolQueryRequest(BaseModel):
     """Model cho request truy vấn một pool."""
     pool_id: int = Field(..., alias='poolId', description="Định danh của pool cần truy vấn.")
-    percentile: float = Field(..., gt=0, lt=100, description="Percentile cần tính (0 < percentile < 100).")
+    percentile: Union[Percentile, conlist(Percentile, min_length=1)] = Field(
+        ..., description="Percentile cần tính (0 < percentile < 100), hoặc danh sách nhiều percentile."
+    )
 
 class PoolQueryResponse(BaseModel):
     """Model cho response sau khi truy vấn pool."""
-    calculated_quantile: float = Field(..., alias='calculatedQuantile', description="Giá trị quantile đã được tính toán.")
+    calculated_quantile: Union[float, List[float]] = Field(
+        ..., alias='calculatedQuantile',
+        description="Giá trị quantile đã được tính toán (danh sách nếu request gửi nhiều percentile)."
+    )
     total_count: int = Field(..., alias='totalCount', description="Tổng số phần tử trong pool.")
 
 
 # --- Nơi lưu trữ dữ liệu (In-Memory) ---
 # Sử dụng dictionary để lưu trữ các pool, cho phép truy xuất nhanh.
-pools: Dict[int, List[float]] = {}
+# Mỗi pool được giữ ở dạng đã sắp xếp (xem SortedPool) để truy vấn không cần sắp xếp lại.
+pools: Dict[int, SortedPool] = {}
+
+# Pool vượt quá TDIGEST_THRESHOLD phần tử sẽ chuyển sang t-digest (bộ nhớ cố định,
+# kết quả xấp xỉ). Mặc định 0 nghĩa là tắt: mọi pool đều được tính chính xác.
+TDIGEST_THRESHOLD = int(os.environ.get("TDIGEST_THRESHOLD", "0"))
+# δ = 500 (khoảng 280 centroid, ~4.5 KiB mỗi pool) giữ sai số thứ hạng ở p0.1/p99.9 trong
+# khoảng ±2e-4; với δ = 100, centroid ở hai đầu quá lớn và sai số lên tới ~7e-4.
+TDIGEST_COMPRESSION = float(os.environ.get("TDIGEST_COMPRESSION", "500"))
+
+# Nếu các giá trị luôn nằm trong một khoảng cố định (ví dụ latency tính bằng µs), đặt
+# BINNED_RANGE_MIN/BINNED_RANGE_MAX để lưu pool mới dưới dạng BinnedRankTree (cập nhật
+# O(log B), sai số không quá độ rộng một bin). Chế độ này chỉ bật khi độ rộng bin không
+# vượt quá BINNED_TOLERANCE (nếu có); ngược lại pool vẫn được tính chính xác.
+# Mỗi pool dạng bin chiếm 8·(BINNED_BIN_COUNT + 1) byte ngay khi được tạo (512 KiB với
+# mặc định 2^16 bin).
+BINNED_RANGE_MIN = float(os.environ["BINNED_RANGE_MIN"]) if "BINNED_RANGE_MIN" in os.environ else None
+BINNED_RANGE_MAX = float(os.environ["BINNED_RANGE_MAX"]) if "BINNED_RANGE_MAX" in os.environ else None
+BINNED_BIN_COUNT = int(os.environ.get("BINNED_BIN_COUNT", str(1 << 16)))
+BINNED_TOLERANCE = float(os.environ["BINNED_TOLERANCE"]) if "BINNED_TOLERANCE" in os.environ else None
+# Cấu hình sai được báo ngay khi khởi động thay vì thành lỗi 400 ở mỗi lần insert.
+if (BINNED_RANGE_MIN is None) != (BINNED_RANGE_MAX is None):
+    raise ValueError("BINNED_RANGE_MIN và BINNED_RANGE_MAX phải được đặt cùng nhau.")
+if BINNED_RANGE_MIN is not None and not BINNED_RANGE_MIN < BINNED_RANGE_MAX:
+    raise ValueError("BINNED_RANGE_MIN phải nhỏ hơn BINNED_RANGE_MAX.")
+if BINNED_BIN_COUNT <= 0:
+    raise ValueError("BINNED_BIN_COUNT phải lớn hơn 0.")
+BINNED_ENABLED = BINNED_RANGE_MIN is not None and (
+    BINNED_TOLERANCE is None
+    or (BINNED_RANGE_MAX - BINNED_RANGE_MIN) / BINNED_BIN_COUNT <= BINNED_TOLERANCE
+)
+
+# Các pool được lưu dưới dạng xấp xỉ (t-digest hoặc theo bin); cả hai đều có
+# `batch_update`, `percentile` và `len`.
+sketches: Dict[int, Union[TDigest, BinnedRankTree]] = {}
+
+# Phiên bản của mỗi pool, tăng sau mỗi lần cập nhật. Phiên bản là một phần của
+# khóa cache kết quả nên các kết quả cũ tự động không còn được dùng tới.
+pool_versions: Dict[int, int] = {}
+QUANTILE_CACHE_SIZE = 4096
+
+# Thống kê (min, max, count, sum) của mỗi pool, được cập nhật ngay khi thêm giá trị.
+# Giúp trả lời một số truy vấn mà không cần chạm vào dữ liệu đã sắp xếp.
+pool_stats: Dict[int, Tuple[float, float, int, float]] = {}
 
 
 # --- Khởi tạo ứng dụng FastAPI ---
@@ -42,46 +102,147 @@ app = FastAPI(
 )
 
 
-# --- Logic tính toán Quantile ---
-def calculate_quantile_from_scratch(data: List[float], percentile: float) -> float:
-    """Tính toán giá trị quantile cho một tập dữ liệu.
+@app.on_event("startup")
+def warm_up_quantile_kernels():
+    """Biên dịch trước kernel Numba khi server khởi động."""
+    if NUMBA_AVAILABLE:
+        warm_up()
 
-    Hàm này sử dụng phương pháp nội suy tuyến tính (linear interpolation) để
-    ước tính giá trị tại một percentile cho trước.
 
-    Args:
-        data: Một danh sách các số.
-        percentile: Giá trị percentile cần tính (từ 0 đến 100).
+# --- Logic tính toán Quantile ---
+def quantile_from_sorted(sorted_data: np.ndarray, percentile: float) -> float:
+    """Tính quantile cho một mảng đã được sắp xếp tăng dần.
 
-    Returns:
-        Giá trị quantile đã được tính toán.
+    Dùng phương pháp nội suy tuyến tính (linear interpolation) giữa hai phần tử
+    gần nhất; vì mảng đã được sắp xếp nên chỉ cần đọc hai vị trí, không phải
+    chọn hay sắp xếp lại.
 
     Raises:
-        ValueError: Nếu danh sách `data` rỗng.
+        ValueError: Nếu mảng rỗng.
     """
-    if not data:
+    n = sorted_data.size
+    if n == 0:
         raise ValueError("Không thể tính quantile cho danh sách rỗng.")
 
-    sorted_data = sorted(data)
-    n = len(sorted_data)
-    # Tính toán thứ hạng (rank) dựa trên percentile.
     rank = (percentile / 100) * (n - 1)
-    
-    if rank.is_integer():
-        return sorted_data[int(rank)]
-    else:
-        # Nội suy tuyến tính giữa hai giá trị gần nhất.
-        lower_index = math.floor(rank)
-        upper_index = math.ceil(rank)
-        lower_value = sorted_data[lower_index]
-        upper_value = sorted_data[upper_index]
-        weight = rank - lower_index
-        return lower_value + weight * (upper_value - lower_value)
+    lower_index = int(rank)
+    weight = rank - lower_index
+
+    lower_value = sorted_data[lower_index]
+    if weight == 0.0:
+        return float(lower_value)
+    return float(lower_value + weight * (sorted_data[lower_index + 1] - lower_value))
+
+
+def quantiles_from_sorted(sorted_data: np.ndarray, percentiles: Sequence[float]) -> np.ndarray:
+    """Tính nhiều quantile cùng lúc cho một mảng đã được sắp xếp tăng dần.
+
+    Phiên bản vector hóa của `quantile_from_sorted`: mọi percentile dùng chung
+    một mảng đã sắp xếp và phép nội suy được thực hiện trên toàn bộ vector.
+
+    Raises:
+        ValueError: Nếu mảng rỗng.
+    """
+    n = sorted_data.size
+    if n == 0:
+        raise ValueError("Không thể tính quantile cho danh sách rỗng.")
+
+    percentiles = np.asarray(percentiles, dtype=np.float64)
+    if NUMBA_AVAILABLE:
+        return sorted_quantiles_kernel(np.ascontiguousarray(sorted_data), percentiles)
+
+    ranks = (percentiles / 100) * (n - 1)
+    lower_indices = ranks.astype(np.intp)
+    upper_indices = np.minimum(lower_indices + 1, n - 1)
+    weights = ranks - lower_indices
+    lower_values = sorted_data[lower_indices]
+    upper_values = sorted_data[upper_indices]
+    return lower_values + weights * (upper_values - lower_values)
+
+
+# Các percentile được client dùng nhiều nhất; mỗi giá trị có một hàm riêng với hằng số
+# percentile/100 được "nướng" sẵn vào code (xem _build_specialized_quantile).
+SPECIALIZED_PERCENTILES = [
+    float(p) for p in os.environ.get("QUANTILE_SPECIALIZED_PERCENTILES", "50,90,95,99,99.9").split(",") if p.strip()
+]
+for _p in SPECIALIZED_PERCENTILES:
+    if not 0 < _p < 100:
+        raise ValueError(f"QUANTILE_SPECIALIZED_PERCENTILES chỉ nhận giá trị trong (0, 100), nhận được {_p}.")
+
+
+def _build_specialized_quantile(percentile: float, index: int):
+    """Sinh (bằng `exec`) một hàm tính quantile cho mảng đã sắp xếp tại `percentile` cố định.
+
+    Hàm sinh ra cho kết quả giống hệt `quantile_from_sorted(a, percentile)` nhưng không
+    phải truyền và chia percentile ở mỗi lần gọi. Mảng đầu vào phải khác rỗng.
+    Tên hàm chỉ dùng `index` để luôn là identifier hợp lệ (repr của float có thể là
+    "1e-05", "inf", ...).
+    """
+    name = f"quantile_{index}"
+    src = (
+        f"def {name}(a):\n"
+        f"    rank = {percentile / 100!r} * (len(a) - 1)\n"
+        f"    lower_index = int(rank)\n"
+        f"    weight = rank - lower_index\n"
+        f"    lower_value = a[lower_index]\n"
+        f"    if weight == 0.0:\n"
+        f"        return float(lower_value)\n"
+        f"    return float(lower_value + weight * (a[lower_index + 1] - lower_value))\n"
+    )
+    namespace: Dict[str, object] = {}
+    exec(compile(src, f"<specialized quantile {percentile}>", "exec"), namespace)
+    return namespace[name]
+
+
+SPECIALIZED_QUANTILES = {
+    p: _build_specialized_quantile(p, i) for i, p in enumerate(SPECIALIZED_PERCENTILES)
+}
+
+
+def _maybe_switch_to_digest(pool_id: int, pool: SortedPool) -> None:
+    """Chuyển pool sang t-digest khi số phần tử vượt quá ngưỡng cấu hình."""
+    if TDIGEST_THRESHOLD <= 0 or len(pool) <= TDIGEST_THRESHOLD:
+        return
+    digest = TDigest(compression=TDIGEST_COMPRESSION)
+    digest.batch_update(pool.sorted_values())
+    sketches[pool_id] = digest
+    del pools[pool_id]
+
+
+@functools.lru_cache(maxsize=QUANTILE_CACHE_SIZE)
+def _cached_quantile(
+    pool_id: int, version: int, percentile: Union[float, Tuple[float, ...]]
+) -> Union[float, Tuple[float, ...]]:
+    """Tính (và ghi nhớ) quantile của một pool tại một phiên bản cụ thể.
+
+    `version` không được dùng trong thân hàm mà chỉ để làm khóa cache: mỗi lần
+    pool được cập nhật, phiên bản tăng lên và kết quả được tính lại.
+    """
+    if pool_id in sketches:
+        sketch = sketches[pool_id]
+        if isinstance(percentile, tuple):
+            return tuple(sketch.percentile(p) for p in percentile)
+        return sketch.percentile(percentile)
+
+    sorted_data = pools[pool_id].sorted_values()
+    if isinstance(percentile, tuple):
+        return tuple(quantiles_from_sorted(sorted_data, percentile).tolist())
+    specialized = SPECIALIZED_QUANTILES.get(percentile)
+    if specialized is not None:
+        return specialized(sorted_data)
+    return quantile_from_sorted(sorted_data, percentile)
 
 
 # --- Các Endpoint của API ---
 
-@app.post("/pools/update", response_model=PoolUpdateResponse, status_code=status.HTTP_200_OK)
+# Trả về dict trực tiếp để bỏ qua bước tạo và validate lại PoolUpdateResponse;
+# model vẫn được dùng để mô tả schema trong /docs.
+@app.post(
+    "/pools/update",
+    response_model=None,
+    responses={200: {"model": PoolUpdateResponse}},
+    status_code=status.HTTP_200_OK,
+)
 async def update_pool(request: PoolUpdateRequest):
     """
     Thêm mới (insert) hoặc cập nhật (append) giá trị vào một pool.
@@ -90,35 +251,85 @@ async def update_pool(request: PoolUpdateRequest):
     Nếu chưa tồn tại, một pool mới sẽ được tạo với các giá trị đã cho.
     """
     pool_id = request.pool_id
-    values_to_add = request.pool_values
-
-    if pool_id in pools:
-        pools[pool_id].extend(values_to_add)
-        response_status = "appended"
-    else:
-        pools[pool_id] = values_to_add
-        response_status = "inserted"
+    values_to_add = np.asarray(request.pool_values, dtype=np.float64)
+
+    # Mỗi dictionary chỉ được tra cứu một lần cho mỗi request.
+    pool = pools.get(pool_id)
+    sketch = sketches.get(pool_id) if pool is None else None
+
+    try:
+        if pool is not None:
+            pool.extend(values_to_add)
+            response_status = "appended"
+        elif sketch is not None:
+            sketch.batch_update(values_to_add)
+            response_status = "appended"
+        elif BINNED_ENABLED:
+            tree = BinnedRankTree(BINNED_RANGE_MIN, BINNED_RANGE_MAX, BINNED_BIN_COUNT)
+            tree.batch_update(values_to_add)
+            sketches[pool_id] = tree
+            response_status = "inserted"
+        else:
+            pool = SortedPool()
+            pool.extend(values_to_add)
+            pools[pool_id] = pool
+            response_status = "inserted"
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    pool_versions[pool_id] = pool_versions.get(pool_id, 0) + 1
+    if values_to_add.size:
+        batch_min = float(values_to_add.min())
+        batch_max = float(values_to_add.max())
+        batch_sum = float(values_to_add.sum())
+        stats = pool_stats.get(pool_id)
+        if stats is None:
+            pool_stats[pool_id] = (batch_min, batch_max, values_to_add.size, batch_sum)
+        else:
+            pool_stats[pool_id] = (
+                min(stats[0], batch_min),
+                max(stats[1], batch_max),
+                stats[2] + values_to_add.size,
+                stats[3] + batch_sum,
+            )
+    if pool is not None:
+        _maybe_switch_to_digest(pool_id, pool)
         
-    return PoolUpdateResponse(status=response_status)
+    return {"status": response_status}
 
 
-@app.post("/pools/query", response_model=PoolQueryResponse, status_code=status.HTTP_200_OK)
+# Response được serialize trực tiếp bằng orjson; PoolQueryResponse chỉ dùng để mô tả schema trong /docs.
+@app.post(
+    "/pools/query",
+    response_class=Response,
+    responses={200: {"model": PoolQueryResponse}},
+    status_code=status.HTTP_200_OK,
+)
 async def query_pool(request: PoolQueryRequest):
     """
     Truy vấn một pool để tính toán giá trị quantile được chỉ định.
+
+    Nếu `percentile` là một danh sách, tất cả quantile được tính trong cùng
+    một lần truy vấn và trả về theo đúng thứ tự đã gửi.
     """
     pool_id = request.pool_id
     percentile = request.percentile
 
+    pool = pools.get(pool_id)
+    if pool is None:
+        pool = sketches.get(pool_id)
+
     # Đảm bảo pool được yêu cầu phải tồn tại.
-    if pool_id not in pools:
+    if pool is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Không tìm thấy pool với ID {pool_id}."
         )
-        
-    pool_values = pools[pool_id]
-    count = len(pool_values)
+
+    count = len(pool)
 
     # Đảm bảo pool không rỗng trước khi tính toán.
     if count == 0:
@@ -127,15 +338,29 @@ async def query_pool(request: PoolQueryRequest):
             detail=f"Pool với ID {pool_id} rỗng, không thể tính quantile."
         )
     
+    if isinstance(pool, SortedPool):
+        pool.record_query()
+
+    # Với nội suy tuyến tính và 0 < percentile < 100, kết quả chỉ trùng min/max khi
+    # mọi giá trị bằng nhau (kể cả pool một phần tử): khi đó trả lời ngay từ thống kê.
+    stats = pool_stats[pool_id]
+    if stats[0] == stats[1]:
+        quantile_value = [stats[0]] * len(percentile) if isinstance(percentile, list) else stats[0]
+        content = orjson.dumps({"calculatedQuantile": quantile_value, "totalCount": count})
+        return Response(content=content, media_type="application/json")
+
+    # Danh sách được chuyển thành tuple để có thể dùng làm khóa cache.
+    cache_key = tuple(percentile) if isinstance(percentile, list) else percentile
     try:
-        quantile_value = calculate_quantile_from_scratch(pool_values, percentile)
+        quantile_value = _cached_quantile(pool_id, pool_versions[pool_id], cache_key)
     except ValueError as e:
          raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
-    return PoolQueryResponse(
-        calculatedQuantile=quantile_value,
-        totalCount=count
-    )
+    if isinstance(quantile_value, tuple):
+        quantile_value = list(quantile_value)
+
+    content = orjson.dumps({"calculatedQuantile": quantile_value, "totalCount": count})
+    return Response(content=content, media_type="application/json")
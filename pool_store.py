@@ -0,0 +1,222 @@
+# pool_store.py
+# Các cấu trúc lưu trữ một pool giá trị: SortedPool (chính xác) và BinnedRankTree (theo bin).
+
+from array import array
+from typing import Sequence, Tuple
+import math
+
+import numpy as np
+
+# Số lần đọc/ghi gần nhất được dùng để phân loại cách truy cập một pool.
+ACCESS_WINDOW = 64
+# Pool có số lần ghi gấp WRITE_HEAVY_RATIO lần số lần đọc được coi là "nhiều ghi".
+WRITE_HEAVY_RATIO = 4
+# Pool nhỏ hơn ngưỡng này và được đọc nhiều hơn ghi sẽ được giữ sắp xếp ngay sau mỗi lần ghi.
+SMALL_POOL_LIMIT = 10_000
+
+
+def merge_sorted(sorted_values: np.ndarray, new_values: np.ndarray) -> np.ndarray:
+    """Sắp xếp `new_values` rồi trộn vào mảng đã sắp xếp `sorted_values` (O(n + k log k)).
+
+    Thứ tự đã có của `sorted_values` luôn được tái sử dụng; nếu các giá trị mới đều
+    không nhỏ hơn (hoặc đều không lớn hơn) phần đã sắp xếp, ví dụ dữ liệu tăng dần
+    theo thời gian, hai phần chỉ cần được nối lại, bỏ qua `np.searchsorted`.
+    """
+    new_sorted = np.sort(new_values)
+    if sorted_values.size == 0:
+        return new_sorted
+    if new_sorted.size == 0:
+        return sorted_values
+    if new_sorted[0] >= sorted_values[-1]:
+        return np.concatenate((sorted_values, new_sorted))
+    if new_sorted[-1] <= sorted_values[0]:
+        return np.concatenate((new_sorted, sorted_values))
+    positions = np.searchsorted(sorted_values, new_sorted)
+    return np.insert(sorted_values, positions, new_sorted)
+
+
+class SortedPool:
+    """Một pool giá trị với bất biến "đã sắp xếp".
+
+    Các giá trị mới được đưa vào hàng đợi `pending` (một `array.array` lưu số
+    thô liên tục, đọc lại bằng `np.frombuffer` không cần sao chép); khi hàng đợi lớn hơn
+    sqrt(n) (hoặc khi có truy vấn), chỉ phần mới được sắp xếp rồi trộn vào
+    mảng đã sắp xếp bằng `np.searchsorted` + `np.insert` (O(n + k)). Nhờ vậy
+    truy vấn quantile chỉ cần đọc hai vị trí trong mảng.
+
+    Thời điểm trộn phụ thuộc vào cách pool được truy cập (đếm trong khoảng
+    ACCESS_WINDOW lần đọc/ghi gần nhất): pool nhỏ được đọc nhiều hơn ghi được trộn
+    ngay sau mỗi lần ghi (giống `bisect.insort`, mọi truy vấn đều O(1)); pool bị ghi
+    nhiều hơn đọc hẳn thì chỉ được trộn khi có truy vấn, tránh các lần trộn không ai dùng.
+    """
+
+    def __init__(self, values: Sequence[float] = ()):
+        self._sorted = np.sort(np.asarray(values, dtype=np.float64))
+        self._pending = array("d")
+        self._reads = 0
+        self._writes = 0
+
+    def __len__(self) -> int:
+        return self._sorted.size + len(self._pending)
+
+    @property
+    def pending_count(self) -> int:
+        """Số giá trị đang chờ được trộn vào mảng đã sắp xếp."""
+        return len(self._pending)
+
+    @property
+    def needs_flush(self) -> bool:
+        """Hàng đợi nên được trộn ngay bây giờ (xem phân loại truy cập ở trên)."""
+        if not self._pending:
+            return False
+        if self._writes > WRITE_HEAVY_RATIO * self._reads:
+            return False
+        if self._reads > self._writes and len(self) < SMALL_POOL_LIMIT:
+            return True
+        return len(self._pending) > math.sqrt(self._sorted.size)
+
+    def _record_access(self, is_read: bool) -> None:
+        if is_read:
+            self._reads += 1
+        else:
+            self._writes += 1
+        # Giảm một nửa bộ đếm để chỉ phản ánh các lần truy cập gần đây.
+        if self._reads + self._writes >= 2 * ACCESS_WINDOW:
+            self._reads //= 2
+            self._writes //= 2
+
+    def record_query(self) -> None:
+        """Ghi nhận một lần truy vấn pool."""
+        self._record_access(is_read=True)
+
+    def _pending_view(self) -> np.ndarray:
+        """View (không sao chép) lên hàng đợi; không được giữ lại khi hàng đợi còn thay đổi."""
+        return np.frombuffer(self._pending, dtype=np.float64)
+
+    def extend(self, values: Sequence[float]) -> None:
+        """Thêm một loạt giá trị vào pool."""
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.size == 0:
+            return
+        self._record_access(is_read=False)
+        self._pending.frombytes(memoryview(np.ascontiguousarray(arr)).cast("B"))
+        if self.needs_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Trộn các giá trị đang chờ vào mảng đã sắp xếp."""
+        if not self._pending:
+            return
+        self._sorted = merge_sorted(self._sorted, self._pending_view())
+        self._pending = array("d")
+
+    def sorted_values(self) -> np.ndarray:
+        """Trả về toàn bộ giá trị của pool theo thứ tự tăng dần."""
+        self.flush()
+        return self._sorted
+
+
+class BinnedRankTree:
+    """Pool xấp xỉ cho các giá trị nằm trong một khoảng [vmin, vmax] cố định.
+
+    Khoảng giá trị được chia thành `bin_count` bin đều nhau; chỉ một cây
+    Fenwick (BIT) trên các bin được lưu (8·(B + 1) byte), cho phép cập nhật
+    trong O(log B) và tìm bin chứa phần tử có thứ hạng cho trước trong
+    O(log B). Sai số của kết quả không vượt quá độ rộng một bin.
+    Giao diện giống `TDigest` (`batch_update`, `percentile`, `len`).
+    """
+
+    def __init__(self, vmin: float, vmax: float, bin_count: int = 1 << 16):
+        if not vmin < vmax:
+            raise ValueError("vmin phải nhỏ hơn vmax.")
+        if bin_count <= 0:
+            raise ValueError("bin_count phải lớn hơn 0.")
+        self.vmin = float(vmin)
+        self.vmax = float(vmax)
+        self.bin_count = int(bin_count)
+        self.step = (self.vmax - self.vmin) / self.bin_count
+        # Cây Fenwick đánh chỉ số từ 1; bit[i] là tổng của một đoạn bin kết thúc tại i.
+        self.bit = np.zeros(self.bin_count + 1, dtype=np.int64)
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def batch_update(self, values: Sequence[float]) -> None:
+        """Lượng tử hóa và thêm một loạt giá trị vào cây.
+
+        Raises:
+            ValueError: Nếu có giá trị nằm ngoài khoảng [vmin, vmax].
+        """
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.size == 0:
+            return
+        if not np.all((arr >= self.vmin) & (arr <= self.vmax)):
+            raise ValueError(
+                f"Giá trị phải nằm trong khoảng [{self.vmin}, {self.vmax}] của pool dạng bin."
+            )
+        indices = np.minimum(((arr - self.vmin) / self.step).astype(np.int64), self.bin_count - 1)
+        touched, counts = np.unique(indices, return_counts=True)
+        self.count += arr.size
+
+        # Cập nhật Fenwick cho mọi bin cùng lúc: mỗi vòng lặp đi lên một mức của cây.
+        nodes = touched + 1
+        while nodes.size:
+            np.add.at(self.bit, nodes, counts)
+            nodes = nodes + (nodes & -nodes)
+            keep = nodes <= self.bin_count
+            nodes = nodes[keep]
+            counts = counts[keep]
+
+    def _find_bin(self, k: int) -> Tuple[int, int]:
+        """Tìm bin chứa phần tử thứ `k` (từ 0) bằng cách đi xuống cây Fenwick.
+
+        Returns:
+            (chỉ số bin, số phần tử đứng trước bin đó).
+        """
+        pos = 0
+        remaining = k + 1
+        step = 1 << (self.bin_count.bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt <= self.bin_count and self.bit[nxt] < remaining:
+                pos = nxt
+                remaining -= int(self.bit[nxt])
+            step >>= 1
+        return pos, k + 1 - remaining
+
+    def _bin_size(self, index: int) -> int:
+        """Số phần tử của bin `index` (từ 0), suy ra từ cây Fenwick trong O(log B)."""
+        node = index + 1
+        size = int(self.bit[node])
+        # bit[node] là tổng đoạn (parent, node]; trừ đi các nút con bên trái để còn lại bin `node`.
+        parent = node - (node & -node)
+        child = node - 1
+        while child != parent:
+            size -= int(self.bit[child])
+            child -= child & -child
+        return size
+
+    def _value_at(self, k: int) -> float:
+        """Ước lượng giá trị của phần tử thứ `k`, coi các phần tử trong một bin phân bố đều."""
+        index, before = self._find_bin(k)
+        in_bin = self._bin_size(index)
+        offset = (k - before + 0.5) / in_bin
+        return self.vmin + (index + offset) * self.step
+
+    def percentile(self, percentile: float) -> float:
+        """Ước lượng giá trị tại `percentile` (từ 0 đến 100).
+
+        Raises:
+            ValueError: Nếu cây rỗng.
+        """
+        if self.count == 0:
+            raise ValueError("Không thể tính quantile cho pool rỗng.")
+        rank = (percentile / 100) * (self.count - 1)
+        lower_index = int(rank)
+        lower_value = self._value_at(lower_index)
+        weight = rank - lower_index
+        if weight == 0.0:
+            return lower_value
+        upper_value = self._value_at(lower_index + 1)
+        return lower_value + weight * (upper_value - lower_value)
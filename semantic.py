@@ -1,9 +1,14 @@
 # semantic.py
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Response, status
 from pydantic import BaseModel
 from typing import List, Optional
 
+import json
+
+import numpy as np
+import orjson
+
 # --- Khởi tạo ứng dụng FastAPI ---
 # Đây là điểm bắt đầu của ứng dụng API.
 app = FastAPI(
@@ -45,12 +50,35 @@ class UpdateBook(BaseModel):
 
 
 # --- Giả lập một Database đơn giản ---
-# Use một list để lưu trữ dữ liệu cho dễ hình dung.
-db_books = [
+# Dữ liệu được lưu theo cột (Structure of Arrays) thay vì một list các đối tượng Book:
+# cột `db_ids` là mảng int64 liên tục, luôn được sắp xếp tăng dần theo ID, nên việc tìm
+# một cuốn sách chỉ là một phép `np.searchsorted` trên vùng nhớ liền mạch.
+# Dữ liệu của từng cuốn sách chỉ được ghép lại (theo schema Book) khi cần trả về response.
+_seed_books = [
     Book(id=1, title="Lão Hạc", author="Nam Cao", year=1943),
     Book(id=2, title="Số Đỏ", author="Vũ Trọng Phụng", year=1936),
     Book(id=3, title="Dế Mèn Phiêu Lưu Ký", author="Tô Hoài", year=1941),
 ]
+db_ids = np.array([b.id for b in _seed_books], dtype=np.int64)
+db_titles: List[str] = [b.title for b in _seed_books]
+db_authors: List[str] = [b.author for b in _seed_books]
+db_years: List[int] = [b.year for b in _seed_books]
+# ID lớn nhất đã cấp phát, tránh phải tính max() trên toàn bộ danh sách mỗi lần tạo sách.
+# ID mới luôn lớn hơn mọi ID hiện có nên chỉ cần nối vào cuối là `db_ids` vẫn được sắp xếp.
+max_id = int(db_ids.max()) if db_ids.size else 0
+
+
+def _find_book_position(book_id: int) -> Optional[int]:
+    """Trả về vị trí của sách trong các cột dữ liệu, hoặc None nếu không tồn tại."""
+    pos = int(np.searchsorted(db_ids, book_id))
+    if pos < db_ids.size and db_ids[pos] == book_id:
+        return pos
+    return None
+
+
+def _book_at(pos: int) -> dict:
+    """Dựng lại dữ liệu (dạng dict theo schema Book) của cuốn sách tại vị trí `pos`."""
+    return {"id": int(db_ids[pos]), "title": db_titles[pos], "author": db_authors[pos], "year": db_years[pos]}
 
 # --- Định nghĩa các Endpoints (Routes) ---
 #  endpoint gốc
@@ -63,31 +91,42 @@ def read_root():
 
 
 # [GET] /books - Lấy danh sách tất cả các cuốn sách
-@app.get("/books", response_model=List[Book])
+@app.get("/books", response_class=Response, responses={200: {"model": List[Book]}})
 def get_all_books():
     """
     Endpoint này trả về một danh sách tất cả các cuốn sách trong "database".
     - URI '/books' là danh từ số nhiều, đại diện cho tài nguyên "sách".
     - HTTP Method GET được sử dụng để lấy dữ liệu mà không thay đổi gì.
-    - Response model là một List[Book] để đảm bảo dữ liệu trả về đúng định dạng.
-    """
-    return db_books
+    - Schema của response là List[Book] (hiển thị trong /docs); dữ liệu được
+      serialize trực tiếp từ các cột bằng orjson, không cần dựng lại từng Book.
+    """
+    books = [
+        {"id": book_id, "title": title, "author": author, "year": year}
+        for book_id, title, author, year in zip(db_ids.tolist(), db_titles, db_authors, db_years)
+    ]
+    try:
+        content = orjson.dumps(books)
+    except orjson.JSONEncodeError:
+        # orjson không hỗ trợ số nguyên vượt quá 64 bit (ví dụ `year` rất lớn),
+        # khi đó quay về bộ encoder chuẩn vốn chấp nhận mọi số nguyên Python.
+        content = json.dumps(books, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return Response(content=content, media_type="application/json")
 
 # [GET] /books/{book_id} - Lấy thông tin một cuốn sách cụ thể
-@app.get("/books/{book_id}", response_model=Book)
+@app.get("/books/{book_id}", response_model=None, responses={200: {"model": Book}})
 def get_book_by_id(book_id: int):
     """
     Endpoint này trả về thông tin của một cuốn sách dựa trên ID.
     - URI '/books/{book_id}' chỉ định một tài nguyên con cụ thể.
     - Nếu không tìm thấy sách, trả về lỗi 404 Not Found, đúng theo ngữ nghĩa HTTP.
     """
-    book = next((b for b in db_books if b.id == book_id), None)
-    if book is None:
+    pos = _find_book_position(book_id)
+    if pos is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
-    return book
+    return _book_at(pos)
 
 # [POST] /books - Tạo một cuốn sách mới
-@app.post("/books", response_model=Book, status_code=status.HTTP_201_CREATED)
+@app.post("/books", response_model=None, responses={201: {"model": Book}}, status_code=status.HTTP_201_CREATED)
 def create_new_book(book_data: CreateBook):
     """
     Endpoint này dùng để tạo một cuốn sách mới.
@@ -96,13 +135,16 @@ def create_new_book(book_data: CreateBook):
     - Trả về status code 201 Created để thông báo tạo thành công.
     - Dữ liệu của cuốn sách vừa tạo sẽ được trả về trong response.
     """
-    new_id = max(b.id for b in db_books) + 1 if db_books else 1
-    new_book = Book(id=new_id, **book_data.dict())
-    db_books.append(new_book)
-    return new_book
+    global max_id, db_ids
+    max_id += 1
+    db_ids = np.append(db_ids, max_id)
+    db_titles.append(book_data.title)
+    db_authors.append(book_data.author)
+    db_years.append(book_data.year)
+    return _book_at(db_ids.size - 1)
 
 # [PUT] /books/{book_id} - Cập nhật thông tin một cuốn sách
-@app.put("/books/{book_id}", response_model=Book)
+@app.put("/books/{book_id}", response_model=None, responses={200: {"model": Book}})
 def update_book_info(book_id: int, book_data: UpdateBook):
     """
     Endpoint này cập nhật thông tin của một cuốn sách đã tồn tại.
@@ -110,20 +152,21 @@ def update_book_info(book_id: int, book_data: UpdateBook):
     - Ở đây, ta dùng logic giống PATCH: chỉ cập nhật các trường được cung cấp.
     - Nếu không tìm thấy sách, trả về lỗi 404 Not Found.
     """
-    book_index = next((i for i, b in enumerate(db_books) if b.id == book_id), None)
+    pos = _find_book_position(book_id)
 
-    if book_index is None:
+    if pos is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
 
-    # Lấy dữ liệu sách hiện tại
-    current_book = db_books[book_index]
-    # Tạo một bản sao có thể thay đổi được
     update_data = book_data.dict(exclude_unset=True) # Chỉ lấy các trường có giá trị được gửi lên
 
-    # Cập nhật sách
-    updated_book = current_book.copy(update=update_data)
-    db_books[book_index] = updated_book
-    return updated_book
+    # Cập nhật trực tiếp trên từng cột dữ liệu
+    if "title" in update_data:
+        db_titles[pos] = update_data["title"]
+    if "author" in update_data:
+        db_authors[pos] = update_data["author"]
+    if "year" in update_data:
+        db_years[pos] = update_data["year"]
+    return _book_at(pos)
 
 # [DELETE] /books/{book_id} - Xóa một cuốn sách
 @app.delete("/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -135,9 +178,13 @@ def delete_book_by_id(book_id: int):
       hành động đã thành công và không có nội dung nào cần trả về.
     - Nếu không tìm thấy sách, trả về lỗi 404 Not Found.
     """
-    book = next((b for b in db_books if b.id == book_id), None)
-    if book is None:
+    global db_ids
+    pos = _find_book_position(book_id)
+    if pos is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
     
-    db_books.remove(book)
+    db_ids = np.delete(db_ids, pos)
+    del db_titles[pos]
+    del db_authors[pos]
+    del db_years[pos]
     # Không cần return vì status code là 204
\ No newline at end of file
@@ -0,0 +1,44 @@
+# semantic_quantile.py
+# Kernel tính quantile được biên dịch bằng Numba (@njit).
+# Nếu không cài được numba, hàm bên dưới chạy như code NumPy thông thường.
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Thay thế `numba.njit` bằng decorator không làm gì."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def sorted_quantiles_kernel(sorted_a, pcts):
+    """Tính nhiều quantile cho mảng float64 đã sắp xếp tăng dần.
+
+    Mảng `sorted_a` phải khác rỗng.
+    """
+    n = sorted_a.size
+    out = np.empty(pcts.size, dtype=np.float64)
+    for i in range(pcts.size):
+        rank = (pcts[i] / 100.0) * (n - 1)
+        lower_index = int(rank)
+        upper_index = min(lower_index + 1, n - 1)
+        weight = rank - lower_index
+        lower_value = sorted_a[lower_index]
+        out[i] = lower_value + weight * (sorted_a[upper_index] - lower_value)
+    return out
+
+
+def warm_up() -> None:
+    """Biên dịch trước kernel để request đầu tiên không phải chờ JIT.
+
+    Pool luôn lưu float64 nên chỉ cần biên dịch một chữ ký (float64[:], float64[:]).
+    """
+    data = np.arange(8, dtype=np.float64)
+    sorted_quantiles_kernel(data, np.array([50.0]))
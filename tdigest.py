@@ -0,0 +1,127 @@
+# tdigest.py
+# Cài đặt gọn của merging t-digest (Dunning & Ertl) dùng để ước lượng
+# percentile cho các pool rất lớn với bộ nhớ cố định ~δ centroid.
+
+from typing import Sequence
+import math
+
+import numpy as np
+
+
+class TDigest:
+    """Merging t-digest với hàm tỉ lệ arcsin k(q) = δ/(2π)·asin(2q−1).
+
+    Các giá trị mới được gom vào một buffer; khi buffer đầy, buffer được
+    trộn với các centroid hiện có để giữ tối đa Θ(δ) centroid. Truy vấn
+    percentile nội suy tuyến tính giữa các centroid liền kề.
+    """
+
+    def __init__(self, compression: float = 500.0):
+        if compression <= 0:
+            raise ValueError("compression phải lớn hơn 0.")
+        self.compression = float(compression)
+        self._means = np.empty(0, dtype=np.float64)
+        self._weights = np.empty(0, dtype=np.float64)
+        self._buffer = []
+        self._buffer_limit = int(5 * self.compression)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float) -> float:
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def batch_update(self, values: Sequence[float]) -> None:
+        """Thêm một loạt giá trị (mỗi giá trị có trọng số 1) vào digest."""
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.size == 0:
+            return
+        self._buffer.append(arr)
+        self.count += arr.size
+        self.min = min(self.min, float(arr.min()))
+        self.max = max(self.max, float(arr.max()))
+        if sum(b.size for b in self._buffer) >= self._buffer_limit:
+            self._compress()
+
+    def _compress(self) -> None:
+        """Trộn buffer vào các centroid theo giới hạn của hàm tỉ lệ."""
+        if not self._buffer:
+            return
+        incoming = np.concatenate(self._buffer)
+        self._buffer = []
+        means = np.concatenate((self._means, incoming))
+        weights = np.concatenate((self._weights, np.ones(incoming.size)))
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+
+        total = weights.sum()
+        new_means = []
+        new_weights = []
+        cur_mean = means[0]
+        cur_weight = weights[0]
+        weight_so_far = 0.0
+        # Trọng số tích lũy tối đa mà centroid hiện tại được phép đạt tới.
+        q_limit = self._k_inverse(self._k(0.0) + 1) * total
+        for mean, weight in zip(means[1:], weights[1:]):
+            if weight_so_far + cur_weight + weight <= q_limit:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                new_means.append(cur_mean)
+                new_weights.append(cur_weight)
+                weight_so_far += cur_weight
+                q = min(weight_so_far / total, 1.0)
+                q_limit = self._k_inverse(min(self._k(q) + 1, self.compression / 4)) * total
+                cur_mean = mean
+                cur_weight = weight
+        new_means.append(cur_mean)
+        new_weights.append(cur_weight)
+
+        self._means = np.asarray(new_means, dtype=np.float64)
+        self._weights = np.asarray(new_weights, dtype=np.float64)
+
+    def percentile(self, percentile: float) -> float:
+        """Ước lượng giá trị tại `percentile` (từ 0 đến 100).
+
+        Quy ước thứ hạng giống với `quantile_from_sorted` trong main.py: khi mọi
+        centroid có trọng số 1, kết quả trùng với nội suy tuyến tính chính xác.
+
+        Raises:
+            ValueError: Nếu digest rỗng.
+        """
+        if self.count == 0:
+            raise ValueError("Không thể tính quantile cho digest rỗng.")
+        self._compress()
+        means = self._means
+        weights = self._weights
+        if means.size == 1:
+            return float(means[0])
+
+        # Vị trí (theo trọng số tích lũy) của tâm mỗi centroid.
+        centers = np.cumsum(weights) - weights / 2
+        target = (percentile / 100) * (self.count - 1) + 0.5
+
+        if target <= centers[0]:
+            if weights[0] == 1:
+                return float(means[0])
+            # Nội suy giữa min và centroid đầu tiên.
+            t = (target - 0.5) / (centers[0] - 0.5)
+            return float(self.min + t * (means[0] - self.min))
+        if target >= centers[-1]:
+            if weights[-1] == 1:
+                return float(means[-1])
+            # Nội suy giữa centroid cuối cùng và max.
+            end = self.count - 0.5
+            t = (target - centers[-1]) / (end - centers[-1])
+            return float(means[-1] + t * (self.max - means[-1]))
+
+        i = int(np.searchsorted(centers, target, side="right")) - 1
+        t = (target - centers[i]) / (centers[i + 1] - centers[i])
+        return float(means[i] + t * (means[i + 1] - means[i]))
@@ -0,0 +1,130 @@
+# test_main.py
+# Kiểm tra các endpoint /pools/update và /pools/query qua TestClient.
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Mỗi test bắt đầu với kho pool và cache rỗng."""
+    for store in (main.pools, main.sketches, main.pool_versions, main.pool_stats):
+        store.clear()
+    main._cached_quantile.cache_clear()
+    yield
+
+
+def update(pool_id, values):
+    response = client.post("/pools/update", json={"poolId": pool_id, "poolValues": values})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def query(pool_id, percentile):
+    return client.post("/pools/query", json={"poolId": pool_id, "percentile": percentile})
+
+
+# --- Cache theo phiên bản pool ---
+
+def test_cached_quantile_invalidated_by_update():
+    update(1, [1.0, 2.0, 3.0, 4.0])
+    first = query(1, 50).json()
+    assert first == {"calculatedQuantile": 2.5, "totalCount": 4}
+
+    update(1, [10.0, 20.0])
+    second = query(1, 50).json()
+    assert second == {"calculatedQuantile": 3.5, "totalCount": 6}
+    assert second["calculatedQuantile"] == np.percentile([1, 2, 3, 4, 10, 20], 50)
+
+
+def test_cached_scalar_and_list_do_not_collide():
+    update(1, [1.0, 2.0, 3.0, 4.0])
+    scalar = query(1, 50).json()["calculatedQuantile"]
+    single = query(1, [50]).json()["calculatedQuantile"]
+    assert scalar == 2.5
+    assert single == [2.5]
+    # Thứ tự ngược lại: kết quả dạng danh sách đã có trong cache không được trả cho scalar.
+    update(2, [1.0, 2.0, 3.0, 4.0])
+    assert query(2, [90]).json()["calculatedQuantile"] == [3.7]
+    assert query(2, 90).json()["calculatedQuantile"] == 3.7
+
+
+# --- Truy vấn nhiều percentile ---
+
+def test_scalar_percentile_returns_scalar():
+    update(1, [5.0, 1.0, 3.0])
+    body = query(1, 25).json()
+    assert body == {"calculatedQuantile": 2.0, "totalCount": 3}
+
+
+def test_list_percentile_returns_list_in_request_order():
+    values = np.random.default_rng(0).normal(size=101).tolist()
+    update(1, values)
+    percentiles = [99, 1, 50, 50, 12.5]
+    body = query(1, percentiles).json()
+    assert body["totalCount"] == 101
+    assert body["calculatedQuantile"] == pytest.approx(np.percentile(values, percentiles).tolist())
+
+
+@pytest.mark.parametrize("percentile", [[], [0], [50, 100], 0, 100])
+def test_invalid_percentile_is_rejected(percentile):
+    update(1, [1.0, 2.0])
+    assert query(1, percentile).status_code == 422
+
+
+def test_constant_pool_list_request_returns_list():
+    update(1, [7.0, 7.0, 7.0])
+    body = query(1, [10, 50, 90]).json()
+    assert body == {"calculatedQuantile": [7.0, 7.0, 7.0], "totalCount": 3}
+    assert query(1, 50).json() == {"calculatedQuantile": 7.0, "totalCount": 3}
+
+
+# --- Hàm quantile sinh sẵn cho các percentile phổ biến ---
+
+@pytest.mark.parametrize("n", [1, 2, 7, 10, 1001])
+@pytest.mark.parametrize("percentile", main.SPECIALIZED_PERCENTILES)
+def test_specialized_quantile_matches_generic(percentile, n):
+    data = np.sort(np.random.default_rng(n).normal(size=n))
+    specialized = main.SPECIALIZED_QUANTILES[percentile]
+    assert specialized(data) == main.quantile_from_sorted(data, percentile)
+
+
+@pytest.mark.parametrize("setting", ["0", "100", "50,150", "-1"])
+def test_invalid_specialized_percentiles_fail_at_import(setting):
+    env = dict(os.environ, QUANTILE_SPECIALIZED_PERCENTILES=setting)
+    result = subprocess.run(
+        [sys.executable, "-c", "import main"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode != 0
+    assert "QUANTILE_SPECIALIZED_PERCENTILES" in result.stderr
+
+
+# --- Kernel Numba và bản NumPy ---
+
+@pytest.mark.parametrize("n", [1, 2, 7, 10, 1001])
+def test_numba_kernel_matches_numpy_fallback(monkeypatch, n):
+    data = np.sort(np.random.default_rng(n).normal(size=n))
+    percentiles = [0.1, 1, 12.5, 50, 50, 90, 99.9]
+
+    kernel = main.sorted_quantiles_kernel(data, np.asarray(percentiles))
+    monkeypatch.setattr(main, "NUMBA_AVAILABLE", True)
+    via_kernel = main.quantiles_from_sorted(data, percentiles)
+    monkeypatch.setattr(main, "NUMBA_AVAILABLE", False)
+    via_numpy = main.quantiles_from_sorted(data, percentiles)
+
+    np.testing.assert_allclose(via_kernel, kernel, rtol=0, atol=0)
+    np.testing.assert_allclose(via_numpy, kernel, rtol=1e-15, atol=1e-15)
+    np.testing.assert_allclose(via_numpy, [main.quantile_from_sorted(data, p) for p in percentiles], rtol=1e-15)
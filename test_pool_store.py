@@ -0,0 +1,126 @@
+# test_pool_store.py
+# So sánh các cấu trúc trong pool_store với một mảng tham chiếu đã sắp xếp / np.percentile.
+
+import numpy as np
+import pytest
+
+import main
+from pool_store import ACCESS_WINDOW, SMALL_POOL_LIMIT, WRITE_HEAVY_RATIO, BinnedRankTree, SortedPool
+
+PERCENTILES = [0, 0.1, 1, 10, 25, 50, 75, 90, 99, 99.9, 100]
+
+
+# --- BinnedRankTree ---
+
+@pytest.mark.parametrize("bin_count", [1, 3, 8, 1000, 1 << 16])
+def test_binned_bin_sizes_match_histogram(bin_count):
+    values = np.random.default_rng(0).uniform(0, 10, size=5000)
+    tree = BinnedRankTree(0, 10, bin_count)
+    for chunk in np.array_split(values, 7):
+        tree.batch_update(chunk)
+
+    indices = np.minimum((values / tree.step).astype(np.int64), bin_count - 1)
+    expected = np.bincount(indices, minlength=bin_count)
+    checked = range(bin_count) if bin_count <= 1000 else np.unique(indices)
+    assert [tree._bin_size(i) for i in checked] == expected[list(checked)].tolist()
+    # Tổng tiền tố đi xuống cây Fenwick phải khớp với tổng tích lũy của histogram.
+    cumulative = np.cumsum(expected)
+    for k in [0, 1, 2499, values.size - 1]:
+        index, before = tree._find_bin(k)
+        assert before == (cumulative[index - 1] if index else 0)
+        assert before <= k < cumulative[index]
+
+
+def test_binned_percentile_within_one_bin():
+    values = np.random.default_rng(1).exponential(scale=100, size=50_000).clip(0, 1000)
+    tree = BinnedRankTree(0, 1000, 1 << 16)
+    tree.batch_update(values)
+
+    assert len(tree) == values.size
+    for p in PERCENTILES:
+        assert abs(tree.percentile(p) - np.percentile(values, p)) <= tree.step
+
+
+def test_binned_rejects_out_of_range_values():
+    tree = BinnedRankTree(0, 1)
+    with pytest.raises(ValueError):
+        tree.batch_update([0.5, 1.5])
+    assert len(tree) == 0
+    with pytest.raises(ValueError):
+        tree.percentile(50)
+    with pytest.raises(ValueError):
+        BinnedRankTree(1, 1)
+
+
+# --- SortedPool ---
+
+def _fill(pool, chunks):
+    for chunk in chunks:
+        pool.extend(chunk)
+    return np.sort(np.concatenate(chunks))
+
+
+def test_sorted_pool_matches_reference():
+    rng = np.random.default_rng(2)
+    chunks = [rng.normal(size=size) for size in (1, 50, 7, 2000, 300)]
+    pool = SortedPool()
+    expected = _fill(pool, chunks)
+
+    assert len(pool) == expected.size
+    np.testing.assert_array_equal(pool.sorted_values(), expected)
+    for p in PERCENTILES:
+        value = main.quantile_from_sorted(pool.sorted_values(), p)
+        assert value == pytest.approx(np.percentile(expected, p))
+
+
+# --- Thời điểm trộn theo cách truy cập ---
+
+def test_small_read_heavy_pool_flushes_on_every_write():
+    pool = SortedPool(np.arange(100.0))
+    for value in (0.5, 42.5, 99.5, -1.0):
+        pool.record_query()
+        pool.record_query()
+        pool.extend([value])
+        assert pool.pending_count == 0
+    assert len(pool) == 104
+
+
+def test_write_heavy_pool_never_flushes_on_write():
+    pool = SortedPool()
+    rng = np.random.default_rng(4)
+    chunks = [rng.normal(size=100) for _ in range(30)]
+    for i, chunk in enumerate(chunks):
+        pool.extend(chunk)
+        assert pool.pending_count == (i + 1) * chunk.size
+    np.testing.assert_array_equal(pool.sorted_values(), np.sort(np.concatenate(chunks)))
+    assert pool.pending_count == 0
+
+
+def test_balanced_large_pool_flushes_past_sqrt_n():
+    pool = SortedPool(np.arange(float(SMALL_POOL_LIMIT)))
+    pool.record_query()
+    limit = int(np.sqrt(SMALL_POOL_LIMIT))
+    pool.extend(np.zeros(limit))
+    assert pool.pending_count == limit
+    pool.extend([0.0])
+    assert pool.pending_count == 0
+
+
+def test_access_counts_halve_at_window():
+    pool = SortedPool(np.arange(10.0))
+    for _ in range(2 * ACCESS_WINDOW - 1):
+        pool.record_query()
+    assert (pool._reads, pool._writes) == (2 * ACCESS_WINDOW - 1, 0)
+    pool.extend([1.0])
+    assert (pool._reads, pool._writes) == (ACCESS_WINDOW - 1, 0)
+
+    # Nhờ việc giảm một nửa, lịch sử đọc cũ không giữ pool ở chế độ "nhiều đọc" mãi:
+    # pool trở thành "nhiều ghi" sau ít lần ghi hơn WRITE_HEAVY_RATIO lần số lần đọc đã có.
+    writes = 0
+    while pool._writes <= WRITE_HEAVY_RATIO * pool._reads:
+        pool.extend([1.0])
+        writes += 1
+    assert writes < WRITE_HEAVY_RATIO * (2 * ACCESS_WINDOW - 1)
+    pending = pool.pending_count
+    pool.extend([2.0])
+    assert pool.pending_count == pending + 1
@@ -0,0 +1,51 @@
+# test_tdigest.py
+# So sánh TDigest với np.percentile (nội suy tuyến tính chính xác).
+
+import numpy as np
+import pytest
+
+from tdigest import TDigest
+
+PERCENTILES = [0, 0.1, 1, 10, 25, 50, 75, 90, 99, 99.9, 100]
+
+
+def test_small_digest_is_exact():
+    """Với ít giá trị so với compression, mọi centroid có trọng số 1 nên kết quả trùng np.percentile."""
+    values = np.random.default_rng(0).normal(size=50)
+    digest = TDigest(compression=100)
+    digest.batch_update(values)
+    for p in PERCENTILES:
+        assert digest.percentile(p) == pytest.approx(np.percentile(values, p))
+
+
+@pytest.mark.parametrize("distribution", ["exponential", "lognormal", "uniform"])
+def test_large_digest_within_rank_tolerance(distribution):
+    rng = np.random.default_rng(1)
+    values = getattr(rng, distribution)(size=200_000)
+    digest = TDigest()
+    for chunk in np.array_split(values, 50):
+        digest.batch_update(chunk)
+
+    assert len(digest) == values.size
+    assert digest.percentile(0) == values.min()
+    assert digest.percentile(100) == values.max()
+    sorted_values = np.sort(values)
+    for p in PERCENTILES:
+        # Sai số được đo theo thứ hạng và co lại theo khoảng cách tới hai đầu (2% của
+        # min(q, 1 - q)), nên p0.1/p99.9 phải chính xác tới ±2e-4 chứ không phải ±1%.
+        q = p / 100
+        rank = np.searchsorted(sorted_values, digest.percentile(p)) / values.size
+        assert rank == pytest.approx(q, abs=max(2e-4, 0.02 * min(q, 1 - q)))
+
+
+def test_single_value_and_empty_digest():
+    digest = TDigest()
+    with pytest.raises(ValueError):
+        digest.percentile(50)
+    digest.batch_update([3.5])
+    assert digest.percentile(50) == 3.5
+
+
+def test_invalid_compression():
+    with pytest.raises(ValueError):
+        TDigest(compression=0)